@@ -1,83 +1,384 @@
+import os
+import functools
+import weakref
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.lines import Line2D
-from datetime import datetime, timedelta
-from matplotlib.patches import Patch
+from datetime import datetime
+
+# pyarrow es opcional: lector de los CSV y copia Parquet de ellos (ver _leer_tabla).
+# pandas ya lo importa; sus submódulos csv y parquet se importan al leer o escribir
+try:
+    import pyarrow as pa
+    HAY_PYARROW = True
+except ImportError:
+    HAY_PYARROW = False
+
+# matplotlib se importa al graficar por primera vez (ver _obtener_figura / graficar_fases):
+# las opciones del menú que no dibujan no pagan su tiempo de importación.
+
+# Numba es opcional: si no está, los kernels usan su versión NumPy equivalente.
+# Con firmas explícitas se compilan (o se cargan de la caché) al importar.
+try:
+    from numba import njit
+    HAY_NUMBA = True
+except ImportError:
+    HAY_NUMBA = False
 
 PACIENTES_FILE = "pacientes.csv"
 REPORTES_FILE = "reportes.csv"
 
+# Copias Parquet ya tipadas de los CSV, para no volver a parsearlos entre sesiones.
+# Los CSV siguen siendo los archivos de referencia: la copia solo se usa si se hizo
+# a partir del CSV con la misma firma (mtime, tamaño) y con esta versión del lector.
+# _VERSION_COPIA se sube cada vez que cambian los tipos con los que se leen los CSV
+PACIENTES_CACHE = "pacientes.parquet"
+REPORTES_CACHE = "reportes.parquet"
+_VERSION_COPIA = 2
+
+# Fases del ciclo en orden; su posición es el código de fase (0..3)
+FASES = ("Menstrual", "Folicular", "Ovulación", "Lútea")
+
+# Registros pendientes de volcar a los DataFrames (ver _flush_reportes / _flush_pacientes)
+_REP_BUFFER: list[tuple] = []
+_PAC_BUFFER: list[tuple[str, str]] = []
+
+# Último resultado de cargar_datos, indexado por la firma (mtime, tamaño) de los CSV
+_CACHE = {}
+
+# Índice por paciente del último DataFrame de reportes consultado: posiciones de
+# fila, fechas ordenadas (datetime64[D]) y resumen calculado a partir de ellas
+_IDX = {"ref": None, "filas": {}, "fechas": {}, "stats": {}, "resultados": {}}
+
+# Códigos de paciente conocidos del último DataFrame de pacientes consultado
+_PAC_SET = {"ref": None, "codigos": set()}
+
+# Tablas día del ciclo -> código de fase, por (promedio, duracion_menstrual)
+_LUT = {}
+
+# Figura de graficar_fases, reutilizada mientras su ventana siga abierta
+_FIGURA = {"fig": None, "ax": None}
+
 
 # ==============================================================
 # UTILIDADES BÁSICAS
 # ==============================================================
 
+def _as_dt(serie):
+    """
+    Convierte a datetime solo si la columna no lo es ya, con resolución de
+    segundos (la más gruesa que admite pandas; las fechas son de días).
+    """
+    if isinstance(serie.dtype, pd.ArrowDtype) and serie.dtype.kind == "M":
+        # Fechas ya reconocidas por el lector de pyarrow (date32): se convierten
+        # en Arrow, sin pasar por objetos date de Python
+        serie = serie.astype("timestamp[s][pyarrow]")
+    elif not pd.api.types.is_datetime64_any_dtype(serie):
+        serie = pd.to_datetime(serie, errors="coerce", cache=True)
+    if serie.dtype != "datetime64[s]":
+        serie = serie.astype("datetime64[s]")
+    return serie
+
+def _codigos_cat(serie):
+    """
+    Columna 'codigo' como categórica de cadenas. Los ceros a la izquierda ya deben
+    venir del lector (ver _leer_csv): aquí solo se convierte el tipo.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype(str).astype("category")
+
+def _firma_archivo(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
 def cargar_datos():
+    clave = (_firma_archivo(PACIENTES_FILE), _firma_archivo(REPORTES_FILE))
+    if _CACHE.get("clave") == clave:
+        return _CACHE["pacientes"], _CACHE["reportes"]
+
     try:
-        pacientes = pd.read_csv(PACIENTES_FILE, dtype={"codigo": str, "nombre": str})
+        pacientes, pac_de_copia = _leer_tabla(
+            PACIENTES_FILE, PACIENTES_CACHE, clave[0], ("codigo", "nombre")
+        )
     except FileNotFoundError:
-        pacientes = pd.DataFrame(columns=["codigo", "nombre"])
+        pacientes, pac_de_copia = pd.DataFrame(columns=["codigo", "nombre"]), True
 
     try:
-        reportes = pd.read_csv(
-            REPORTES_FILE,
-            dtype={"codigo": str, "duracion":"Int64"},
-            parse_dates=["fecha_periodo"],
-            dayfirst=False
+        reportes, rep_de_copia = _leer_tabla(
+            REPORTES_FILE, REPORTES_CACHE, clave[1], ("codigo",),
+            dtype={"duracion":"Int64"},
+            parse_dates=["fecha_periodo"], dayfirst=False
         )
     except FileNotFoundError:
-        reportes = pd.DataFrame(columns=["codigo", "fecha_periodo", "duracion"])
+        reportes, rep_de_copia = pd.DataFrame(columns=["codigo", "fecha_periodo", "duracion"]), True
     
-    # Asegurar tipos y normalizar
-    if "codigo" in pacientes.columns:
-        pacientes["codigo"] = pacientes["codigo"].astype(str)
-    if "codigo" in reportes.columns:
-        reportes["codigo"] = reportes["codigo"].astype(str)
+    # Asegurar tipos y normalizar (sin coste si el lector ya dejó los tipos correctos).
+    # 'codigo' se guarda como categórico: un valor por paciente, códigos enteros por fila
+    pacientes["codigo"] = _codigos_cat(pacientes["codigo"])
+    reportes["codigo"] = _codigos_cat(reportes["codigo"])
     if "duracion" in reportes.columns:
         reportes["duracion"] = reportes["duracion"].astype("Int64")
     if "fecha_periodo" in reportes.columns:
-        reportes["fecha_periodo"] = pd.to_datetime(reportes["fecha_periodo"], errors="coerce")
+        reportes["fecha_periodo"] = _as_dt(reportes["fecha_periodo"])
+
+    # Renovar las copias Parquet de los CSV que hubo que parsear
+    if not pac_de_copia:
+        _escribir_copia(pacientes, PACIENTES_CACHE, clave[0])
+    if not rep_de_copia:
+        _escribir_copia(reportes, REPORTES_CACHE, clave[1])
 
+    _indice_fechas(reportes)
+    _codigos_pacientes(pacientes)
+    _CACHE.update(clave=clave, pacientes=pacientes, reportes=reportes)
     return pacientes, reportes
 
+def _leer_tabla(path, copia, firma, texto, **opciones_csv):
+    """
+    Lee la tabla del CSV 'path' desde su copia Parquet si esta se hizo con la
+    misma firma del CSV; si no, parsea el CSV (ver _leer_csv).
+    Devuelve (df, viene_de_la_copia). Lanza FileNotFoundError si no hay CSV.
+    """
+    if HAY_PYARROW and firma is not None:
+        try:
+            import pyarrow.parquet as pa_parquet
+            # La firma está en los metadatos del esquema: se compara sin leer los datos
+            metadatos = pa_parquet.read_schema(copia).metadata or {}
+            if metadatos.get(b"firma") == _firma_copia(firma):
+                return pd.read_parquet(copia), True
+        except (OSError, ValueError):
+            pass  # sin copia o ilegible: se parsea el CSV
+    return _leer_csv(path, texto, **opciones_csv), False
+
+def _leer_csv(path, texto, **opciones_csv):
+    """
+    Parsea el CSV 'path' leyendo las columnas 'texto' como cadenas tal cual
+    (un código '007' no debe convertirse en el número 7).
+    Con pyarrow se usa su lector con los tipos de esas columnas fijados; sin él,
+    read_csv con el motor C y 'opciones_csv'.
+    """
+    if HAY_PYARROW:
+        import pyarrow.csv as pa_csv
+        conversion = pa_csv.ConvertOptions(column_types={c: pa.string() for c in texto})
+        # pyarrow ya reconoce las fechas ISO al leer (date32): se dejan en Arrow para
+        # que _as_dt no tenga que convertirlas una a una desde objetos date
+        return pa_csv.read_csv(path, convert_options=conversion).to_pandas(
+            types_mapper=lambda tipo: pd.ArrowDtype(tipo) if pa.types.is_date(tipo) else None
+        )
+    dtype = dict.fromkeys(texto, str) | opciones_csv.pop("dtype", {})
+    return pd.read_csv(path, dtype=dtype, engine="c", **opciones_csv)
+
+def _firma_copia(firma):
+    """Firma de la copia Parquet: versión del lector más la firma (mtime, tamaño) del CSV."""
+    return f"{_VERSION_COPIA}:{firma[0]}:{firma[1]}".encode()
+
+def _escribir_copia(df, copia, firma):
+    """Guarda 'df' (ya tipado) como copia Parquet del CSV con firma 'firma'."""
+    if not HAY_PYARROW or firma is None:
+        return
+    import pyarrow.parquet as pa_parquet
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({**tabla.schema.metadata, b"firma": _firma_copia(firma)})
+    try:
+        pa_parquet.write_table(tabla, copia)
+    except OSError:
+        pass  # la copia es opcional; el CSV ya tiene los datos
+
+def _concat_codigos(df, nuevos):
+    """
+    Concatena 'nuevos' a 'df' manteniendo 'codigo' categórico: los códigos
+    nuevos se añaden al final de las categorías, sin refactorizar la columna.
+    """
+    existentes = _codigos_cat(df["codigo"]).cat.categories
+    categorias = existentes.append(nuevos["codigo"].cat.categories.difference(existentes))
+    tipo = pd.CategoricalDtype(categorias)
+    return pd.concat(
+        [df.astype({"codigo": tipo}), nuevos.astype({"codigo": tipo})], ignore_index=True
+    )
+
+def _flush_pacientes(pacientes):
+    """Materializa los pacientes pendientes en 'pacientes' con un único concat."""
+    if _PAC_BUFFER:
+        nuevos = pd.DataFrame(_PAC_BUFFER, columns=["codigo", "nombre"])
+        nuevos["codigo"] = _codigos_cat(nuevos["codigo"])
+        if pacientes.empty:
+            pacientes = nuevos
+        else:
+            pacientes = _concat_codigos(pacientes, nuevos)
+        _PAC_BUFFER.clear()
+    return pacientes
+
+def _flush_reportes(reportes):
+    """Materializa los periodos pendientes en 'reportes' con un único concat."""
+    if _REP_BUFFER:
+        nuevos = pd.DataFrame(_REP_BUFFER, columns=["codigo", "fecha_periodo", "duracion"])
+        nuevos["duracion"] = nuevos["duracion"].astype("Int64")
+        nuevos["fecha_periodo"] = _as_dt(nuevos["fecha_periodo"])
+        nuevos["codigo"] = _codigos_cat(nuevos["codigo"])
+        if reportes.empty:
+            reportes = nuevos
+        else:
+            reportes = _concat_codigos(reportes, nuevos)
+        _REP_BUFFER.clear()
+    return reportes
+
+def _indice_reportes(reportes):
+    """
+    Índice por paciente de 'reportes': posiciones de sus filas y fechas ordenadas.
+    Se construye con un único groupby y se reutiliza mientras se consulte el mismo DataFrame.
+    Las pacientes sin fechas válidas aparecen con un array de fechas vacío.
+    """
+    if _IDX["ref"] is None or _IDX["ref"]() is not reportes:
+        filas = {str(c): pos for c, pos in reportes.groupby("codigo", sort=False, observed=True).indices.items()}
+        todas = reportes["fecha_periodo"].to_numpy("datetime64[D]")
+        fechas = {}
+        for c, pos in filas.items():
+            f = todas[pos]
+            fechas[c] = np.sort(f[~np.isnat(f)])
+        _IDX.update(filas=filas, fechas=fechas, stats={}, resultados={}, ref=weakref.ref(reportes))
+    return _IDX
+
+def _indice_fechas(reportes):
+    """Devuelve {codigo: fechas ordenadas} para 'reportes'."""
+    return _indice_reportes(reportes)["fechas"]
+
+def _duraciones(reportes, codigo):
+    """Duraciones registradas (sin nulos) de una paciente, en el orden del archivo."""
+    pos = _indice_reportes(reportes)["filas"].get(str(codigo))
+    if pos is None or "duracion" not in reportes.columns:
+        return np.empty(0, dtype=np.int64)
+    d = reportes["duracion"].array[pos].to_numpy(dtype=np.float64, na_value=np.nan)
+    return d[~np.isnan(d)].astype(np.int64)
+
+def _por_paciente(funcion):
+    """
+    Memoriza funcion(reportes, codigo, ...) por paciente (y argumentos extra)
+    mientras se consulte el mismo DataFrame; al guardar datos nuevos el índice
+    se reconstruye y se olvida.
+    """
+    @functools.wraps(funcion)
+    def envoltura(reportes, codigo, *args, **kwargs):
+        resultados = _indice_reportes(reportes)["resultados"]
+        clave = (funcion.__name__, str(codigo), args, tuple(sorted(kwargs.items())))
+        if clave not in resultados:
+            resultados[clave] = funcion(reportes, codigo, *args, **kwargs)
+        return resultados[clave]
+    return envoltura
+
+def _estadisticas_paciente(reportes, codigo):
+    """
+    Resumen de una paciente: fechas, fechas únicas, días entre reglas, última
+    fecha (como datetime64[D] y como Timestamp), promedio y desviación del
+    ciclo. Se calcula una vez por paciente y DataFrame.
+    Devuelve None si la paciente no tiene registros.
+    """
+    codigo = str(codigo)
+    fechas = _indice_fechas(reportes).get(codigo)
+    if fechas is None:
+        return None
+
+    stats = _IDX["stats"].get(codigo)
+    if stats is None:
+        unicas = np.unique(fechas)
+        difs = np.diff(unicas).astype(np.int32)
+        promedio = desviacion = None
+        if difs.size:
+            promedio = int(round(difs.mean()))
+            desviacion = int(round(difs.std(ddof=1))) if difs.size > 1 else 0
+        ultimo_dia = fechas[-1] if fechas.size else np.datetime64("NaT", "D")
+        stats = {
+            "fechas": fechas,
+            "unicas": unicas,
+            "difs": difs,
+            "ultimo_dia": ultimo_dia,
+            "ultima_fecha": pd.Timestamp(ultimo_dia),
+            "promedio": promedio,
+            "desviacion": desviacion,
+        }
+        _IDX["stats"][codigo] = stats
+    return stats
+
+def _codigos_pacientes(pacientes):
+    """Conjunto de códigos de 'pacientes' para comprobar existencia en O(1)."""
+    if _PAC_SET["ref"] is None or _PAC_SET["ref"]() is not pacientes:
+        col = pacientes["codigo"]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.cat.remove_unused_categories().cat.categories
+        _PAC_SET["codigos"] = set(col.astype(str))
+        _PAC_SET["ref"] = weakref.ref(pacientes)
+    return _PAC_SET["codigos"]
+
+def _anexar_csv(df, desde, path):
+    """
+    Escribe en 'path' solo las filas de 'df' a partir de la posición 'desde'.
+    Si el archivo no existe (o está vacío) se escribe completo, con cabecera.
+    """
+    firma = _firma_archivo(path)
+    if firma is None or firma[1] == 0:
+        df.to_csv(path, index=False)
+    elif len(df) > desde:
+        # Un CSV editado a mano puede no terminar en salto de línea: sin él, la
+        # primera fila nueva se pegaría a la última existente
+        with open(path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        df.iloc[desde:].to_csv(path, mode="a", header=False, index=False)
+
 def guardar_datos(pacientes, reportes):
-    pacientes.to_csv(PACIENTES_FILE, index=False)
-    reportes.to_csv(REPORTES_FILE, index=False)
+    n_pacientes, n_reportes = len(pacientes), len(reportes)
+    pacientes = _flush_pacientes(pacientes)
+    reportes = _flush_reportes(reportes)
+
+    # Las filas anteriores ya están en disco: solo se añaden las nuevas
+    _anexar_csv(pacientes, n_pacientes, PACIENTES_FILE)
+    _anexar_csv(reportes, n_reportes, REPORTES_FILE)
+
+    # Lo que hay en memoria coincide con los archivos; evita que cargar_datos los relea
+    clave = (_firma_archivo(PACIENTES_FILE), _firma_archivo(REPORTES_FILE))
+    _CACHE.update(clave=clave, pacientes=pacientes, reportes=reportes)
+
+    # Los CSV que cambiaron tienen otra firma: se renuevan sus copias Parquet
+    if len(pacientes) > n_pacientes:
+        _escribir_copia(pacientes, PACIENTES_CACHE, clave[0])
+    if len(reportes) > n_reportes:
+        _escribir_copia(reportes, REPORTES_CACHE, clave[1])
+    return pacientes, reportes
 
 def registrar_paciente(pacientes, codigo, nombre):
-    if codigo in pacientes["codigo"].values:
+    """
+    Deja la paciente pendiente en el buffer de pacientes; no modifica ni devuelve
+    'pacientes'. Su código ya cuenta como registrado, pero la fila solo aparece
+    en el DataFrame (y en el CSV) al llamar a guardar_datos.
+    """
+    codigo = str(codigo)
+    codigos = _codigos_pacientes(pacientes)
+    if codigo in codigos:
         print(f"⚠️ El código {codigo} ya existe.")
     else:
-        pacientes.loc[len(pacientes)] = [codigo, nombre]
+        # Se acumula en el buffer; el DataFrame se reconstruye una sola vez al guardar
+        codigos.add(codigo)
+        _PAC_BUFFER.append((codigo, nombre))
         print(f"✅ Paciente {nombre} registrada.")
-    return pacientes
 
 
 def registrar_periodo(reportes, pacientes, codigo, fecha, duracion=5):
+    """
+    Deja el periodo pendiente en el buffer de reportes; no modifica ni devuelve
+    'reportes'. La fila solo aparece en el DataFrame (y en el CSV) al llamar a
+    guardar_datos, que es quien la materializa.
+    """
     if duracion is None or duracion < 1:
         duracion = 5
 
-    if str(codigo) not in pacientes["codigo"].astype(str).values:
+    if str(codigo) not in _codigos_pacientes(pacientes):
         print("❌ Código no encontrado.")
-        return reportes
-    # Crear DataFrame nuevo con tipos definidos
-    nueva_fila = pd.DataFrame.from_records(
-        [{"codigo": codigo, "fecha_periodo": pd.to_datetime(fecha), "duracion": duracion}],
-        columns=["codigo", "fecha_periodo", "duracion"]
-    )
-
-    # Asegurar tipos antes de concatenar
-    if reportes.empty:
-        reportes = nueva_fila.copy()
-    else:
-        # Convertir columna fecha_periodo a datetime si aún no lo es
-        if not np.issubdtype(reportes["fecha_periodo"].dtype, np.datetime64):
-            reportes["fecha_periodo"] = pd.to_datetime(reportes["fecha_periodo"], errors="coerce")
-
-        reportes = pd.concat([reportes, nueva_fila], ignore_index=True)
+        return
+    # Se acumula en el buffer; el DataFrame se reconstruye una sola vez al guardar
+    _REP_BUFFER.append((str(codigo), pd.to_datetime(fecha), duracion))
     print(f"🩸 Periodo registrado para #{codigo} en fecha: {fecha} (duración: {duracion} días).")
-    return reportes
 
 
 # ==============================================================
@@ -89,46 +390,32 @@ def calcular_promedio_ciclo(reportes, codigo):
     Calcula promedio y desviación del ciclo para 'codigo'.
     Usa fechas únicas y ordenadas para evitar difs cero por duplicados.
     """
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
-    if df.empty:
-        return None, None
-
-    # Normalizar fechas, ordenar y quitar duplicados
-    fechas = pd.to_datetime(df["fecha_periodo"], errors="coerce").dropna().sort_values().drop_duplicates()
-    if len(fechas) < 2:
-        return None, None
-
-    difs = fechas.diff().dt.days.dropna()
-    if len(difs) == 0:
+    stats = _estadisticas_paciente(reportes, codigo)
+    if stats is None:
         return None, None
+    return stats["promedio"], stats["desviacion"]
 
-    promedio = difs.mean()
-    desviacion = difs.std()
-
-    # Evitar NaN → reemplazar por 0
-    if pd.isna(promedio):
-        promedio = 28.0  # Valor por defecto típico
-    if pd.isna(desviacion):
-        desviacion = 0.0
-
-    return int(round(promedio)), int(round(desviacion))
-
+@_por_paciente
 def obtener_duracion_menstrual(reportes, codigo):
     """Obtiene la duración menstrual promedio para un paciente"""
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
-    if df.empty or "duracion" not in df.columns or df["duracion"].dropna().empty:
+    duraciones = _duraciones(reportes, codigo)
+    if duraciones.size == 0:
         return 5  # valor por defecto
     
-    return int(df["duracion"].dropna().mean())
+    return int(duraciones.mean())
 
+@_por_paciente
 def calcular_fases_ciclo(reportes, codigo):
     """
     Función centralizada para calcular todas las fases del ciclo.
     Ahora usa la estrategia de predicción avanzada.
     """
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
-    if df.empty:
+    stats = _estadisticas_paciente(reportes, codigo)
+    if stats is None:
         return None
+    ultima_fecha = stats["ultima_fecha"]
+    ultimo_dia = stats["ultimo_dia"]
+    un_dia = np.timedelta64(1, "D")
 
     # Usar predicción avanzada
     fecha_predicha, rango_confianza, metadatos = predecir_proximo_ciclo(reportes, codigo)
@@ -138,7 +425,7 @@ def calcular_fases_ciclo(reportes, codigo):
         promedio, desviacion = calcular_promedio_ciclo(reportes, codigo)
         if promedio is None:
             promedio = 28
-        fecha_predicha = df["fecha_periodo"].max() + timedelta(days=promedio)
+        fecha_predicha = pd.Timestamp(ultimo_dia + promedio * un_dia)
         metodo = "fallback_simple"
     else:
         promedio = metadatos["promedio_ciclo"]
@@ -146,7 +433,6 @@ def calcular_fases_ciclo(reportes, codigo):
         metodo = metadatos["metodo"]
 
     duracion_menstrual = obtener_duracion_menstrual_optima(reportes, codigo)
-    ultima_fecha = df["fecha_periodo"].max()
 
     # Calcular fases (lógica existente mejorada)
     duracion_folicular = 9
@@ -159,19 +445,23 @@ def calcular_fases_ciclo(reportes, codigo):
         # Recalcular folicular para mantener el total
         duracion_folicular = promedio - (duracion_menstrual + duracion_ovulacion + duracion_lutea)
 
-    fases = {
-        "Menstrual": (ultima_fecha, ultima_fecha + timedelta(days=duracion_menstrual - 1)),
-        "Folicular": (ultima_fecha + timedelta(days=duracion_menstrual),
-                      ultima_fecha + timedelta(days=duracion_menstrual + duracion_folicular - 1)),
-        "Ovulación": (ultima_fecha + timedelta(days=duracion_menstrual + duracion_folicular),
-                      ultima_fecha + timedelta(days=duracion_menstrual + duracion_folicular + duracion_ovulacion - 1)),
-        "Lútea": (ultima_fecha + timedelta(days=duracion_menstrual + duracion_folicular + duracion_ovulacion),
-                  ultima_fecha + timedelta(days=promedio - 1))
-    }
-
-    df_fases = pd.DataFrame([
-        {"fase": fase, "inicio": fechas[0], "fin": fechas[1]} for fase, fechas in fases.items()
-    ])
+    # Límites de las cuatro fases (inicio, fin) como desplazamientos desde la última regla
+    fin_menstrual = duracion_menstrual
+    fin_folicular = fin_menstrual + duracion_folicular
+    fin_ovulacion = fin_folicular + duracion_ovulacion
+    desplazamientos = np.array([
+        0, fin_menstrual - 1,
+        fin_menstrual, fin_folicular - 1,
+        fin_folicular, fin_ovulacion - 1,
+        fin_ovulacion, promedio - 1,
+    ], dtype=np.int64)
+    limites = ultimo_dia + desplazamientos.astype("timedelta64[D]")
+
+    df_fases = pd.DataFrame({
+        "fase": FASES,
+        "inicio": limites[0::2],
+        "fin": limites[1::2],
+    })
 
     return {
         "promedio": promedio,
@@ -187,46 +477,47 @@ def calcular_fases_ciclo(reportes, codigo):
 
 def calcular_fases_siguientes(reportes, codigo):
     """
-    Función de presentación - usa la lógica centralizada
+    Función de presentación - usa la lógica centralizada.
+    Devuelve el resultado completo de calcular_fases_ciclo (fases, método, metadatos...).
     """
     resultado = calcular_fases_ciclo(reportes, codigo)
     if resultado is None:
         print("❌ No hay datos para esa paciente.")
         return None
     
-    return resultado["fases"]
+    return resultado
 
+@_por_paciente
 def calcular_estadisticas_ciclo_avanzado(reportes, codigo, pesos_recientes=0.6):
     """
     Calcula estadísticas del ciclo usando media móvil ponderada.
     pesos_recientes: 0-1, qué tanto peso dar a ciclos recientes (0.6 = 60% a los 3 más recientes)
     """
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
-    
-    # Normalizar fechas y ordenar
-    fechas = pd.to_datetime(df["fecha_periodo"], errors="coerce").dropna().sort_values().drop_duplicates()
-    
-    if len(fechas) < 2:
+    stats = _estadisticas_paciente(reportes, codigo)
+    if stats is None:
         return None, None, None
 
-    # Calcular duraciones entre ciclos
-    difs = fechas.diff().dt.days.dropna().tolist()
+    # Duraciones entre ciclos (sobre fechas únicas y ordenadas), ya calculadas
+    difs = stats["difs"]
     
-    if not difs:
+    if difs.size == 0:
         return None, None, None
 
+    # Media, desviación y pendiente en una sola pasada
+    media, desviacion_total, pendiente = _momentos_ciclo(difs)
+
     # Estrategia según cantidad de datos disponibles
     if len(difs) == 1:
         # Solo un ciclo registrado → usar ese valor
-        promedio_ponderado = difs[0]
+        promedio_ponderado = media
         desviacion = 0
         tendencia = 0
         
     elif len(difs) <= 3:
         # Pocos ciclos → promedio simple
-        promedio_ponderado = np.mean(difs)
-        desviacion = np.std(difs)
-        tendencia = difs[-1] - difs[0]  # tendencia simple
+        promedio_ponderado = media
+        desviacion = desviacion_total
+        tendencia = float(difs[-1] - difs[0])  # tendencia simple
         
     else:
         # Suficientes datos → media móvil ponderada
@@ -237,17 +528,16 @@ def calcular_estadisticas_ciclo_avanzado(reportes, codigo, pesos_recientes=0.6):
         peso_recientes = pesos_recientes
         peso_antiguos = 1 - peso_recientes
         
-        avg_reciente = np.mean(ciclos_recientes)
-        avg_antiguo = np.mean(ciclos_antiguos) if ciclos_antiguos else avg_reciente
+        avg_reciente = ciclos_recientes.mean()
+        avg_antiguo = ciclos_antiguos.mean() if ciclos_antiguos.size else avg_reciente
         
         promedio_ponderado = (avg_reciente * peso_recientes + 
                             avg_antiguo * peso_antiguos)
         
-        desviacion = np.std(difs)
+        desviacion = desviacion_total
         
-        # Calcular tendencia (pendiente de los últimos n ciclos)
-        x = range(len(difs))
-        tendencia = np.polyfit(x, difs, 1)[0]  # pendiente de la regresión lineal
+        # Tendencia: pendiente de la regresión lineal de los ciclos
+        tendencia = pendiente
 
     # Ajustar según tendencia (suavizado)
     ajuste_tendencia = tendencia * 0.3  # solo aplicar 30% de la tendencia
@@ -258,45 +548,46 @@ def calcular_estadisticas_ciclo_avanzado(reportes, codigo, pesos_recientes=0.6):
     
     return int(round(promedio_ajustado)), int(round(desviacion)), tendencia
 
+@_por_paciente
 def obtener_duracion_menstrual_optima(reportes, codigo):
     """Calcula duración menstrual considerando estabilidad"""
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
+    duraciones = _duraciones(reportes, codigo)
     
-    if df.empty or "duracion" not in df.columns or df["duracion"].dropna().empty:
+    if duraciones.size == 0:
         return 5
-
-    duraciones = df["duracion"].dropna().astype(int).tolist()
     
-    if len(duraciones) == 1:
-        return duraciones[0]
+    if duraciones.size == 1:
+        return int(duraciones[0])
     
     # Para duración menstrual, usar moda o último valor si es estable
-    ultima_duracion = duraciones[-1]
+    ultima_duracion = int(duraciones[-1])
     
     # Si la última duración está dentro de 1 día del promedio, confiar en ella
-    promedio = np.mean(duraciones)
+    promedio = duraciones.mean()
     if abs(ultima_duracion - promedio) <= 1:
         return ultima_duracion
     else:
         # Si hay mucha variación, usar redondeo del promedio
         return int(round(promedio))
 
+@_por_paciente
 def predecir_proximo_ciclo(reportes, codigo):
     """
     Función principal de predicción que usa estrategia adaptativa
     Retorna: fecha_predicha, rango_confianza, metadatos
     """
-    df = reportes[reportes["codigo"].astype(str) == str(codigo)].copy()
+    stats = _estadisticas_paciente(reportes, codigo)
     
-    if df.empty:
+    if stats is None:
         return None, None, {"metodo": "sin_datos"}
     
     # Obtener última fecha
-    fechas = pd.to_datetime(df["fecha_periodo"], errors="coerce").dropna().sort_values()
-    if fechas.empty:
+    fechas = stats["fechas"]
+    if fechas.size == 0:
         return None, None, {"metodo": "sin_fechas_validas"}
     
-    ultima_fecha = fechas.iloc[-1]
+    ultimo_dia = stats["ultimo_dia"]
+    un_dia = np.timedelta64(1, "D")
     
     # Calcular estadísticas
     promedio, desviacion, tendencia = calcular_estadisticas_ciclo_avanzado(reportes, codigo)
@@ -310,20 +601,24 @@ def predecir_proximo_ciclo(reportes, codigo):
         metodo = "modelo_ponderado"
     
     # Calcular fecha predicha
-    fecha_base_prediccion = ultima_fecha + timedelta(days=promedio)
+    dia_prediccion = ultimo_dia + promedio * un_dia
     
-    # Ajustar según tendencia si hay suficientes datos
+    # Ajustar según tendencia si hay suficientes datos.
+    # La tendencia es exacta (entera, o la pendiente de _momentos_ciclo), así que
+    # los casos límite son deterministas: el umbral es estricto (una pendiente de
+    # exactamente ±0.5 no ajusta) y la mitad de la tendencia se redondea con
+    # round(), empates al par (pendiente ±1 → 0 días, ±3 → ±2 días).
     if tendencia and abs(tendencia) > 0.5 and len(fechas) >= 4:
         ajuste_dias = int(round(tendencia * 0.5))  # ajuste conservador
-        fecha_base_prediccion += timedelta(days=ajuste_dias)
+        dia_prediccion += ajuste_dias * un_dia
         metodo = f"modelo_ajustado_tendencia_{ajuste_dias}"
     
     # Calcular rango de confianza basado en desviación
     margen_error = min(5, desviacion)  # máximo 5 días de margen
-    fecha_minima = fecha_base_prediccion - timedelta(days=margen_error)
-    fecha_maxima = fecha_base_prediccion + timedelta(days=margen_error)
+    fecha_minima = dia_prediccion - margen_error * un_dia
+    fecha_maxima = dia_prediccion + margen_error * un_dia
     
-    rango_confianza = (fecha_minima, fecha_maxima)
+    rango_confianza = (pd.Timestamp(fecha_minima), pd.Timestamp(fecha_maxima))
     
     metadatos = {
         "metodo": metodo,
@@ -332,21 +627,110 @@ def predecir_proximo_ciclo(reportes, codigo):
         "tendencia": tendencia,
         "margen_error": margen_error,
         "ciclos_analizados": len(fechas) - 1,
-        "ultimo_ciclo": None if len(fechas) < 2 else (fechas.iloc[-1] - fechas.iloc[-2]).days
+        "ultimo_ciclo": None if len(fechas) < 2 else int((fechas[-1] - fechas[-2]) // un_dia)
     }
     
-    return fecha_base_prediccion, rango_confianza, metadatos
+    return pd.Timestamp(dia_prediccion), rango_confianza, metadatos
+
+# Media, desviación estándar (poblacional) y pendiente de la regresión lineal
+# de 'difs' frente a 0..n-1, en una sola pasada y sin np.polyfit.
+if HAY_NUMBA:
+    @njit("UniTuple(float64, 3)(int32[:])", cache=True, fastmath=True)
+    def _momentos_ciclo(difs):
+        n = difs.size
+        sy = 0.0
+        syy = 0.0
+        sxy = 0.0
+        for i in range(n):
+            y = float(difs[i])
+            sy += y
+            syy += y * y
+            sxy += i * y
+        media = sy / n
+        varianza = max(syy / n - media * media, 0.0)
+        sx = n * (n - 1) / 2.0
+        sxx = (n - 1) * n * (2 * n - 1) / 6.0
+        denominador = n * sxx - sx * sx
+        pendiente = (n * sxy - sx * sy) / denominador if denominador else 0.0
+        return media, np.sqrt(varianza), pendiente
+else:
+    def _momentos_ciclo(difs):
+        n = difs.size
+        y = difs.astype(np.float64)
+        sy = y.sum()
+        media = sy / n
+        varianza = max((y @ y) / n - media * media, 0.0)
+        sx = n * (n - 1) / 2.0
+        sxx = (n - 1) * n * (2 * n - 1) / 6.0
+        denominador = n * sxx - sx * sx
+        pendiente = (n * (np.arange(n) @ y) - sx * sy) / denominador if denominador else 0.0
+        return float(media), float(np.sqrt(varianza)), float(pendiente)
+
+# Fase teórica de cada día según su distancia (en días) a la última regla.
+# Códigos: 0 Menstrual, 1 Folicular, 2 Ovulación, 3 Lútea.
+if HAY_NUMBA:
+    @njit("int8[:](int64[:], int64, int64)", cache=True, fastmath=True)
+    def _clasificar_dias(dias_desde_inicio, promedio, duracion_menstrual):
+        codigos = np.empty(dias_desde_inicio.size, np.int8)
+        for i in range(dias_desde_inicio.size):
+            dia_ciclo = dias_desde_inicio[i] % promedio
+            if dias_desde_inicio[i] < 0:
+                dia_ciclo += promedio
+            if dia_ciclo < duracion_menstrual:
+                codigos[i] = 0
+            elif dia_ciclo <= duracion_menstrual + 9:
+                codigos[i] = 1
+            elif dia_ciclo <= duracion_menstrual + 11:
+                codigos[i] = 2
+            else:
+                codigos[i] = 3
+        return codigos
+else:
+    def _clasificar_dias(dias_desde_inicio, promedio, duracion_menstrual):
+        # Un solo gather sobre la tabla; los días previos a la última regla
+        # caen en la segunda mitad (promedio + resto)
+        tabla = _tabla_fases(promedio, duracion_menstrual)
+        return tabla[dias_desde_inicio % promedio + (dias_desde_inicio < 0) * promedio]
+
+def _tabla_fases(promedio, duracion_menstrual):
+    """Códigos de fase para los valores 0..2*promedio-1 del día del ciclo."""
+    clave = (promedio, duracion_menstrual)
+    tabla = _LUT.get(clave)
+    if tabla is None:
+        dia_ciclo = np.arange(2 * promedio)
+        tabla = np.full(2 * promedio, 3, dtype=np.int8)            # Lútea
+        tabla[dia_ciclo <= duracion_menstrual + 11] = 2            # Ovulación
+        tabla[dia_ciclo <= duracion_menstrual + 9] = 1             # Folicular
+        tabla[dia_ciclo < duracion_menstrual] = 0                  # Menstrual
+        _LUT[clave] = tabla
+    return tabla
+
 
 # ==============================================================
 # GRAFICACIÓN (SOLO PARA VISUALIZACIÓN)
 # ==============================================================
 
-def graficar_fases(reportes, codigo, fechas_consulta):
+def _obtener_figura():
+    """Devuelve la figura de la línea de tiempo, limpia, creándola solo si no existe."""
+    import matplotlib.pyplot as plt
+
+    fig = _FIGURA["fig"]
+    if fig is None or not plt.fignum_exists(fig.number):
+        fig, ax = plt.subplots(figsize=(12, 4))
+        fig.canvas.manager.set_window_title("Línea de Tiempo de Período")
+        _FIGURA.update(fig=fig, ax=ax)
+    else:
+        _FIGURA["ax"].clear()
+    return _FIGURA["fig"], _FIGURA["ax"]
+
+def graficar_fases(reportes, codigo, fechas_consulta, datos_ciclo=None):
     """
-    Función que solo se encarga de graficar, usando los datos calculados
+    Función que solo se encarga de graficar, usando los datos calculados.
+    datos_ciclo: resultado de calcular_fases_ciclo si ya se tiene; si no, se calcula aquí.
     """
     # Obtener datos calculados
-    datos_ciclo = calcular_fases_ciclo(reportes, codigo)
+    if datos_ciclo is None:
+        datos_ciclo = calcular_fases_ciclo(reportes, codigo)
     if datos_ciclo is None:
         print("❌ No hay datos para esa paciente.")
         return
@@ -356,25 +740,31 @@ def graficar_fases(reportes, codigo, fechas_consulta):
     df_fases = datos_ciclo["fases"]
     ultima_fecha = datos_ciclo["ultima_fecha"]
 
-    # Normalizar fechas de consulta
-    fechas_consulta = sorted(pd.to_datetime(f, errors="coerce") for f in fechas_consulta)
-    fechas_consulta = [f for f in fechas_consulta if not pd.isna(f)]
-    if not fechas_consulta:
+    # Normalizar fechas de consulta (el menú ya las entrega parseadas y ordenadas)
+    ya_normalizadas = (isinstance(fechas_consulta, pd.DatetimeIndex)
+                       and not fechas_consulta.hasnans
+                       and fechas_consulta.is_monotonic_increasing)
+    if not ya_normalizadas:
+        fechas_consulta = pd.to_datetime(list(fechas_consulta), errors="coerce").dropna().sort_values()
+    if fechas_consulta.empty:
         print("❌ No se ingresaron fechas válidas.")
         return
 
     # --- Ajuste de rango ---
+    un_dia = np.timedelta64(1, "D")
     dias_mostrar = 30
     if len(fechas_consulta) == 1:
-        fecha_ref = fechas_consulta[0]
-        fecha_inicio = fecha_ref - timedelta(days=dias_mostrar // 2)
-        fecha_fin = fecha_ref + timedelta(days=dias_mostrar // 2)
+        dia_ref = np.datetime64(fechas_consulta[0], "D")
+        dia_inicio = dia_ref - (dias_mostrar // 2) * un_dia
+        dia_fin = dia_ref + (dias_mostrar // 2) * un_dia
     else:
         margen = 2
-        fecha_inicio = min(fechas_consulta) - timedelta(days=margen)
-        fecha_fin = max(fechas_consulta) + timedelta(days=margen)
+        dia_inicio = np.datetime64(fechas_consulta[0], "D") - margen * un_dia
+        dia_fin = np.datetime64(fechas_consulta[-1], "D") + margen * un_dia
 
-    rango = pd.date_range(fecha_inicio, fecha_fin, freq="D")
+    # Aritmética en datetime64[D]; el índice de pandas solo se usa para dibujar
+    dias = np.arange(dia_inicio, dia_fin + un_dia, dtype="datetime64[D]")
+    rango = pd.DatetimeIndex(dias)
 
     # --- Colores de fases ---
     colores_fases = {
@@ -384,71 +774,78 @@ def graficar_fases(reportes, codigo, fechas_consulta):
         "Lútea": "skyblue"
     }
 
-    # --- Calcular fase para cada día del rango ---
-    fases_rango = []
-    for fecha in rango:
-        # Determinar qué fase corresponde a esta fecha
-        fase_encontrada = None
-        for _, fase in df_fases.iterrows():
-            if fase["inicio"] <= fecha <= fase["fin"]:
-                fase_encontrada = fase["fase"]
-                break
-        
-        if fase_encontrada is None:
-            # Si no está en ninguna fase calculada, calcular fase teórica
-            dias_desde_inicio = (fecha - ultima_fecha).days
-            dia_ciclo = dias_desde_inicio % promedio if dias_desde_inicio >= 0 else promedio + (dias_desde_inicio % promedio)
-            
-            if dia_ciclo < duracion_menstrual:
-                fase_encontrada = "Menstrual"
-            elif dia_ciclo <= duracion_menstrual + 9:  # Folicular
-                fase_encontrada = "Folicular"
-            elif dia_ciclo <= duracion_menstrual + 11:  # Ovulación
-                fase_encontrada = "Ovulación"
-            else:
-                fase_encontrada = "Lútea"
-        
-        fases_rango.append(fase_encontrada)
+    # --- Calcular fase para cada día del rango (vectorizado) ---
+    # Fase teórica según el día del ciclo
+    dias_desde_inicio = (dias - np.datetime64(ultima_fecha, "D")).astype(np.int64)
+    codigos_fase = _clasificar_dias(dias_desde_inicio, int(promedio), int(duracion_menstrual))
+
+    # Las fases calculadas tienen prioridad sobre la teórica (la primera que coincida)
+    inicios = df_fases["inicio"].to_numpy()
+    fines = df_fases["fin"].to_numpy()
+    codigos_calculadas = np.array([FASES.index(f) for f in df_fases["fase"]], dtype=np.int8)
+    # Se evalúa también el día siguiente al rango: es el fin (exclusivo) del último tramo
+    dias_ext = np.append(dias, dias[-1] + un_dia)
+    dentro = (dias_ext[:, None] >= inicios) & (dias_ext[:, None] <= fines)   # días × fases
+    es_calculada = dentro.any(axis=1)
+    codigos_fase = np.where(es_calculada[:-1], codigos_calculadas[dentro[:-1].argmax(axis=1)], codigos_fase)
 
     # --- Gráfico ---
-    fig, ax = plt.subplots(figsize=(12, 4))
-    fig.canvas.manager.set_window_title("Línea de Tiempo de Período")
-
-    # Dibujar fases
-    inicio_fase = rango[0]
-    fase_actual = fases_rango[0]
-    for i in range(1, len(rango)):
-        if fases_rango[i] != fase_actual or i == len(rango) - 1:
-            fin_fase = rango[i] if fases_rango[i] != fase_actual else rango[i] + timedelta(days=1)
-            
-            # Determinar si es estimación (fuera del rango de fases calculadas)
-            estimacion = not any(
-                (fase["inicio"] <= inicio_fase <= fase["fin"]) or 
-                (fase["inicio"] <= fin_fase <= fase["fin"])
-                for _, fase in df_fases.iterrows()
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+
+    fig, ax = _obtener_figura()
+
+    # Dibujar fases: un tramo por cada racha de días con la misma fase
+    cortes = np.flatnonzero(np.diff(codigos_fase)) + 1
+    inicios_tramo = np.concatenate(([0], cortes))
+    fines_tramo = np.concatenate((cortes, [len(rango)]))
+
+    # Un tramo es estimación si ni su inicio ni su fin caen en una fase calculada
+    estimaciones = ~(es_calculada[inicios_tramo] | es_calculada[fines_tramo])
+
+    # Un último día suelto queda fuera del eje
+    if inicios_tramo[-1] == len(rango) - 1:
+        inicios_tramo, fines_tramo, estimaciones = inicios_tramo[:-1], fines_tramo[:-1], estimaciones[:-1]
+
+    # Tramos como (inicio, ancho) en días; el fin de cada tramo es exclusivo
+    x_inicio = dias[inicios_tramo]
+    anchos = (fines_tramo - inicios_tramo).astype("timedelta64[D]")
+    codigos_tramo = codigos_fase[inicios_tramo]
+
+    # Un único colectivo de rectángulos por fase y tipo (calculada / estimación)
+    for codigo_fase, fase_actual in enumerate(FASES):
+        for estimacion in (False, True):
+            sel = (codigos_tramo == codigo_fase) & (estimaciones == estimacion)
+            if not sel.any():
+                continue
+            ax.broken_barh(
+                list(zip(x_inicio[sel], anchos[sel])), (0, 1),
+                transform=ax.get_xaxis_transform(),
+                color=colores_fases[fase_actual],
+                alpha=0.4 if estimacion else 0.8,
+                hatch='///' if estimacion else None,
             )
 
-            color = colores_fases[fase_actual]
-            alpha = 0.4 if estimacion else 0.8
-            hatch = '///' if estimacion else None
-
-            ax.axvspan(inicio_fase, fin_fase, color=color, alpha=alpha, hatch=hatch)
-            
-            # Etiqueta de fase
-            centro = inicio_fase + (fin_fase - inicio_fase) / 2
-            ax.text(centro, 0.5, fase_actual, ha="center", va="center", fontsize=9, color="black")
-            
-            inicio_fase = rango[i]
-            fase_actual = fases_rango[i]
+    # Etiqueta de fase en el centro de cada tramo
+    centros = x_inicio.astype("datetime64[h]") + anchos.astype("timedelta64[h]") // 2
+    estilo_etiqueta = dict(ha="center", va="center", fontsize=9, color="black",
+                           transform=ax.get_xaxis_transform())
+    for centro, codigo_fase in zip(pd.DatetimeIndex(centros), codigos_tramo):
+        ax.text(centro, 0.5, FASES[codigo_fase], **estilo_etiqueta)
 
     # --- Líneas de fechas consultadas ---
-    for f in fechas_consulta:
-        ax.axvline(f, color="black", linestyle="--", linewidth=1)
+    # Un único LineCollection vertical, en fracción de eje, para todas las fechas
+    ax.vlines(fechas_consulta, 0, 1, transform=ax.get_xaxis_transform(),
+              color="black", linestyle="--", linewidth=1)
 
     # --- Títulos y leyenda ---
-    ax.set_xlim(rango.min(), rango.max())
-    ax.set_xticks(rango)
-    ax.set_xticklabels([d.strftime("%b-%d") for d in rango], rotation=45)
+    ax.set_xlim(rango[0], rango[-1])
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=12))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%b-%d"))
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+    ax.set_ylim(0, 1)
     ax.set_yticks([])
     ax.set_title(f"Fases del ciclo — Paciente {codigo}", loc="left")
     fecha_hora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -460,7 +857,8 @@ def graficar_fases(reportes, codigo, fechas_consulta):
         Patch(facecolor='gray', edgecolor='black', alpha=0.4, hatch='///', label='Estimación')
     ]
     ax.legend(handles=leyenda, loc='upper right', title="Simbología:")
-    plt.tight_layout()
+    fig.tight_layout()
+    fig.canvas.draw_idle()
     plt.show()
 
 
@@ -484,8 +882,8 @@ def menu():
             codigo = input("Código: ")
             nombre = input("Nombre: ")
             if codigo and nombre:
-                pacientes = registrar_paciente(pacientes, codigo, nombre)
-                guardar_datos(pacientes, reportes)
+                registrar_paciente(pacientes, codigo, nombre)
+                pacientes, reportes = guardar_datos(pacientes, reportes)
             else:
                 print("❌ Ingrese valores correctamente.")
 
@@ -493,9 +891,12 @@ def menu():
             codigo = input("Código de paciente: ")
             fecha = input("Fecha del periodo (YYYY-MM-DD): ")
 
-            if not codigo and not fecha:
+            if not codigo or not fecha:
                 print("❌ Ingrese valores correctamente.")
                 continue 
+            if pd.isna(pd.to_datetime(fecha, format="%Y-%m-%d", errors="coerce")):
+                print("❌ Fecha inválida, use el formato YYYY-MM-DD.")
+                continue
             
             duracion_dias_input = input("Duración del periodo en días (opcional, por defecto 5): ")
             try:
@@ -506,26 +907,27 @@ def menu():
                     duracion_dias = None
             except ValueError:
                 duracion_dias = None
-            reportes = registrar_periodo(reportes, pacientes, codigo, fecha, duracion_dias)
-            guardar_datos(pacientes, reportes)
+            registrar_periodo(reportes, pacientes, codigo, fecha, duracion_dias)
+            pacientes, reportes = guardar_datos(pacientes, reportes)
 
         elif opcion == "3":
+            # Solo relee si los CSV cambiaron en disco (mtime/tamaño); si no, devuelve la caché
             pacientes, reportes = cargar_datos()
             codigo = input("Código de paciente: ")
-            df_fases = calcular_fases_siguientes(reportes, codigo)
-            if codigo is not None and df_fases is not None:
+            datos_ciclo = calcular_fases_siguientes(reportes, codigo)
+            if codigo is not None and datos_ciclo is not None:
+                df_fases = datos_ciclo["fases"]
                 print("\n📅 Estimación de fases del siguiente ciclo:")
-                for _, row in df_fases.iterrows():
-                    print(f"\t🩸 {row['fase']}: Desde\t{row['inicio'].date()} \t→ {row['fin'].date()}")
+                for row in df_fases.itertuples(index=False):
+                    print(f"\t🩸 {row.fase}: Desde\t{row.inicio.date()} \t→ {row.fin.date()}")
 
                 # Mostrar fecha estimada del siguiente periodo
-                datos_ciclo = calcular_fases_ciclo(reportes, codigo)
-                if datos_ciclo:
-                    print(f"🔮 Método de predicción: {datos_ciclo['metodo_prediccion']}")
-                    print(f"📊 Ciclos analizados: {datos_ciclo['metadatos']['ciclos_analizados']}")
-                    print(f"🎯 Rango de confianza: {datos_ciclo['rango_confianza'][0].date()} a {datos_ciclo['rango_confianza'][1].date()}")
+                print(f"🔮 Método de predicción: {datos_ciclo['metodo_prediccion']}")
+                print(f"📊 Ciclos analizados: {datos_ciclo['metadatos']['ciclos_analizados']}")
+                print(f"🎯 Rango de confianza: {datos_ciclo['rango_confianza'][0].date()} a {datos_ciclo['rango_confianza'][1].date()}")
 
         elif opcion == "4":
+            # Solo relee si los CSV cambiaron en disco (mtime/tamaño); si no, devuelve la caché
             pacientes, reportes = cargar_datos()
             codigo = input("Código de paciente: ")
             if not codigo:
@@ -536,9 +938,9 @@ def menu():
             
             if fechas_input:
                 try:
-                    fechas = [pd.to_datetime(f.strip(), errors="coerce") for f in fechas_input.split(",")]
-                    fechas = [f for f in fechas if not pd.isna(f)]
-                    if not fechas:
+                    tokens = [f.strip() for f in fechas_input.split(",") if f.strip()]
+                    fechas = pd.to_datetime(tokens, errors="coerce").dropna().sort_values()
+                    if fechas.empty:
                         print("❌ No se ingresaron fechas válidas.")
                     print(' >> Cierre la ventana del gráfico para continuar...')
                     graficar_fases(reportes, codigo, fechas)
@@ -553,7 +955,7 @@ def menu():
                     fecha_fin = datos_ciclo["fases"]["fin"].max()
                     fechas = [fecha_inicio, fecha_fin]
                     print(' >> Cierre la ventana del gráfico para continuar...')
-                    graficar_fases(reportes, codigo, fechas)
+                    graficar_fases(reportes, codigo, fechas, datos_ciclo=datos_ciclo)
                 else:
                     print("❌ No se pudieron calcular las fases para este paciente.")
 
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main  # noqa: E402
+
+
+class CargarDatosTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        # Estado de módulo: nada de un test (filas pendientes, índices) pasa al siguiente
+        main._CACHE.clear()
+        main._REP_BUFFER.clear()
+        main._PAC_BUFFER.clear()
+        main._IDX.update(ref=None, filas={}, fechas={}, stats={}, resultados={})
+        main._PAC_SET.update(ref=None, codigos=set())
+        main._LUT.clear()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def escribir(self, nombre, texto):
+        with open(nombre, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+    def test_codigo_conserva_ceros_a_la_izquierda(self):
+        self.escribir(main.PACIENTES_FILE, "codigo,nombre\n007,Ana\n")
+        self.escribir(
+            main.REPORTES_FILE,
+            "codigo,fecha_periodo,duracion\n007,2024-01-01,5\n007,2024-01-29,4\n",
+        )
+        pacientes, reportes = main.cargar_datos()
+        self.assertEqual(pacientes["codigo"].astype(str).tolist(), ["007"])
+        self.assertEqual(reportes["codigo"].astype(str).tolist(), ["007", "007"])
+        self.assertEqual(reportes["fecha_periodo"].dtype, "datetime64[s]")
+        self.assertEqual(main.calcular_promedio_ciclo(reportes, "007")[0], 28)
+
+    def test_duracion_grande_no_rompe_carga_ni_guardado(self):
+        self.escribir(main.PACIENTES_FILE, "codigo,nombre\n001,Ana\n")
+        self.escribir(main.REPORTES_FILE, "codigo,fecha_periodo,duracion\n001,2024-01-01,40000\n")
+        pacientes, reportes = main.cargar_datos()
+        self.assertEqual(reportes["duracion"].tolist(), [40000])
+        main.registrar_periodo(reportes, pacientes, "001", "2024-01-29", 70000)
+        pacientes, reportes = main.guardar_datos(pacientes, reportes)
+        self.assertEqual(reportes["duracion"].tolist(), [40000, 70000])
+
+    def test_periodo_registrado_aparece_al_guardar(self):
+        self.escribir(main.PACIENTES_FILE, "codigo,nombre\n1,Ana\n")
+        self.escribir(main.REPORTES_FILE, "codigo,fecha_periodo,duracion\n1,2025-09-06,5\n1,2025-10-04,5\n")
+        pacientes, reportes = main.cargar_datos()
+        self.assertIsNone(main.registrar_periodo(reportes, pacientes, "1", "2025-11-01"))
+        pacientes, reportes = main.guardar_datos(pacientes, reportes)
+        self.assertEqual(len(reportes), 3)
+        self.assertEqual(main.calcular_fases_ciclo(reportes, "1")["ultima_fecha"], main.pd.Timestamp("2025-11-01"))
+        main._CACHE.clear()
+        self.assertEqual(len(main.cargar_datos()[1]), 3)
+
+    def test_guardar_renueva_la_copia_parquet(self):
+        if not main.HAY_PYARROW:
+            self.skipTest("la copia Parquet requiere pyarrow")
+        self.escribir(main.PACIENTES_FILE, "codigo,nombre\n1,Ana\n")
+        self.escribir(main.REPORTES_FILE, "codigo,fecha_periodo,duracion\n1,2025-10-04,5\n")
+        pacientes, reportes = main.cargar_datos()
+        main.registrar_periodo(reportes, pacientes, "1", "2025-11-01")
+        main.guardar_datos(pacientes, reportes)
+        firma = main._firma_archivo(main.REPORTES_FILE)
+        reportes, de_copia = main._leer_tabla(main.REPORTES_FILE, main.REPORTES_CACHE, firma, ("codigo",))
+        self.assertTrue(de_copia)
+        self.assertEqual(len(reportes), 2)
+
+    def test_anexar_a_csv_sin_salto_final(self):
+        self.escribir(main.PACIENTES_FILE, "codigo,nombre\n001,Ana")
+        pacientes, reportes = main.cargar_datos()
+        self.assertIsNone(main.registrar_paciente(pacientes, "002", "Bea"))
+        pacientes, _ = main.guardar_datos(pacientes, reportes)
+        self.assertEqual(pacientes["codigo"].astype(str).tolist(), ["001", "002"])
+        with open(main.PACIENTES_FILE, encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), ["codigo,nombre", "001,Ana", "002,Bea"])
+
+
+if __name__ == "__main__":
+    unittest.main()
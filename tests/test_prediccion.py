@@ -0,0 +1,183 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main  # noqa: E402
+
+
+def reportes_con_ciclos(*ciclos, codigo="1", inicio="2024-01-01"):
+    """Reportes de una paciente cuyos ciclos duran 'ciclos' días, en orden."""
+    fechas = pd.Timestamp(inicio) + pd.to_timedelta(np.cumsum((0,) + ciclos), unit="D")
+    return pd.DataFrame({
+        "codigo": main._codigos_cat(pd.Series([codigo] * len(fechas))),
+        "fecha_periodo": main._as_dt(pd.Series(fechas)),
+        "duracion": pd.array([5] * len(fechas), dtype="Int64"),
+    })
+
+
+class TendenciaTest(unittest.TestCase):
+    def test_pendiente_exacta_uno_redondea_al_par(self):
+        reportes = reportes_con_ciclos(28, 29, 30, 31)
+        fecha, _, meta = main.predecir_proximo_ciclo(reportes, "1")
+        self.assertEqual(meta["tendencia"], 1.0)
+        self.assertEqual(meta["metodo"], "modelo_ajustado_tendencia_0")
+        self.assertEqual(meta["promedio_ciclo"], 30)
+        self.assertEqual(fecha, pd.Timestamp("2024-05-28"))
+
+    def test_pendiente_exacta_media_no_ajusta(self):
+        reportes = reportes_con_ciclos(30, 30, 29, 29, 28)
+        _, _, meta = main.predecir_proximo_ciclo(reportes, "1")
+        self.assertEqual(meta["tendencia"], -0.5)
+        self.assertEqual(meta["metodo"], "modelo_ponderado")
+
+    def test_pendiente_sobre_el_umbral_ajusta(self):
+        _, _, meta = main.predecir_proximo_ciclo(reportes_con_ciclos(26, 28, 30, 32), "1")
+        self.assertEqual(meta["tendencia"], 2.0)
+        self.assertEqual(meta["metodo"], "modelo_ajustado_tendencia_1")
+
+
+# Historial con fechas desordenadas, una fecha duplicada, una fila sin fecha (NaT)
+# y duraciones nulas; "2" tiene una sola fecha y "3" ninguna válida.
+# Los valores esperados son los que daba la versión con filtros por paciente.
+REPORTES_CSV = """codigo,fecha_periodo,duracion
+1,2025-03-03,5
+1,2025-01-06,4
+1,2025-02-03,
+1,2025-02-03,6
+1,,5
+1,2025-03-30,
+1,2025-04-28,5
+2,2025-05-01,
+3,,4
+"""
+
+
+class EquivalenciaTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        main._CACHE.clear()
+        main._REP_BUFFER.clear()
+        main._PAC_BUFFER.clear()
+        main._IDX.update(ref=None, filas={}, fechas={}, stats={}, resultados={})
+        main._PAC_SET.update(ref=None, codigos=set())
+        main._LUT.clear()
+        with open(main.PACIENTES_FILE, "w", encoding="utf-8") as f:
+            f.write("codigo,nombre\n1,Ana\n2,Bea\n3,Eva\n")
+        with open(main.REPORTES_FILE, "w", encoding="utf-8") as f:
+            f.write(REPORTES_CSV)
+        self.pacientes, self.reportes = main.cargar_datos()
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_calcular_promedio_ciclo(self):
+        self.assertEqual(main.calcular_promedio_ciclo(self.reportes, "1"), (28, 1))
+        self.assertEqual(main.calcular_promedio_ciclo(self.reportes, "2"), (None, None))
+        self.assertEqual(main.calcular_promedio_ciclo(self.reportes, "3"), (None, None))
+        self.assertEqual(main.calcular_promedio_ciclo(self.reportes, "4"), (None, None))
+
+    def test_predecir_proximo_ciclo(self):
+        fecha, rango, meta = main.predecir_proximo_ciclo(self.reportes, "1")
+        self.assertEqual(fecha, pd.Timestamp("2025-05-26"))
+        self.assertEqual(rango, (pd.Timestamp("2025-05-25"), pd.Timestamp("2025-05-27")))
+        self.assertAlmostEqual(meta.pop("tendencia"), 0.2)
+        self.assertEqual(meta, {
+            "metodo": "modelo_ponderado", "promedio_ciclo": 28, "desviacion_estandar": 1,
+            "margen_error": 1, "ciclos_analizados": 5, "ultimo_ciclo": 29,
+        })
+
+        fecha, rango, meta = main.predecir_proximo_ciclo(self.reportes, "2")
+        self.assertEqual(fecha, pd.Timestamp("2025-05-29"))
+        self.assertEqual(rango, (pd.Timestamp("2025-05-27"), pd.Timestamp("2025-05-31")))
+        self.assertEqual(meta["metodo"], "valor_default")
+        self.assertEqual(meta["ciclos_analizados"], 0)
+        self.assertIsNone(meta["ultimo_ciclo"])
+
+        self.assertEqual(main.predecir_proximo_ciclo(self.reportes, "3"), (None, None, {"metodo": "sin_fechas_validas"}))
+        self.assertEqual(main.predecir_proximo_ciclo(self.reportes, "4"), (None, None, {"metodo": "sin_datos"}))
+
+    def test_duracion_menstrual(self):
+        self.assertEqual(main.obtener_duracion_menstrual(self.reportes, "1"), 5)
+        self.assertEqual(main.obtener_duracion_menstrual_optima(self.reportes, "1"), 5)
+        self.assertEqual(main.obtener_duracion_menstrual_optima(self.reportes, "2"), 5)
+        self.assertEqual(main.obtener_duracion_menstrual_optima(self.reportes, "3"), 4)
+
+    def test_calcular_fases_ciclo(self):
+        datos = main.calcular_fases_ciclo(self.reportes, "1")
+        self.assertEqual((datos["promedio"], datos["desviacion"], datos["duracion_menstrual"]), (28, 1, 5))
+        self.assertEqual(datos["ultima_fecha"], pd.Timestamp("2025-04-28"))
+        self.assertEqual(datos["siguiente_periodo"], pd.Timestamp("2025-05-26"))
+        self.assertEqual(datos["metodo_prediccion"], "modelo_ponderado")
+        fases = datos["fases"]
+        self.assertEqual(fases["fase"].tolist(), list(main.FASES))
+        self.assertEqual(
+            fases["inicio"].dt.strftime("%Y-%m-%d").tolist(),
+            ["2025-04-28", "2025-05-03", "2025-05-12", "2025-05-14"],
+        )
+        self.assertEqual(
+            fases["fin"].dt.strftime("%Y-%m-%d").tolist(),
+            ["2025-05-02", "2025-05-11", "2025-05-13", "2025-05-25"],
+        )
+
+        datos = main.calcular_fases_ciclo(self.reportes, "3")
+        self.assertEqual(datos["metodo_prediccion"], "fallback_simple")
+        self.assertTrue(datos["fases"][["inicio", "fin"]].isna().all().all())
+        self.assertIsNone(main.calcular_fases_ciclo(self.reportes, "4"))
+
+    def test_memo_se_invalida_al_guardar(self):
+        antes = main.calcular_fases_ciclo(self.reportes, "1")
+        self.assertIs(main.calcular_fases_ciclo(self.reportes, "1"), antes)
+
+        main.registrar_periodo(self.reportes, self.pacientes, "1", "2025-05-25", 4)
+        _, reportes = main.guardar_datos(self.pacientes, self.reportes)
+        despues = main.calcular_fases_ciclo(reportes, "1")
+        self.assertIsNot(despues, antes)
+        self.assertEqual(despues["ultima_fecha"], pd.Timestamp("2025-05-25"))
+        self.assertEqual(main.predecir_proximo_ciclo(reportes, "1")[2]["ciclos_analizados"], 6)
+
+
+class KernelsTest(unittest.TestCase):
+    """Los kernels de Numba y su versión NumPy dan el mismo resultado."""
+
+    @classmethod
+    def setUpClass(cls):
+        if not main.HAY_NUMBA:
+            raise unittest.SkipTest("sin Numba solo existe la versión NumPy")
+        # Segunda copia del módulo, importada como si Numba no estuviera instalado
+        numba = sys.modules.get("numba")
+        sys.modules["numba"] = None
+        try:
+            spec = importlib.util.spec_from_file_location("main_sin_numba", main.__file__)
+            cls.numpy = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(cls.numpy)
+        finally:
+            sys.modules["numba"] = numba
+        assert not cls.numpy.HAY_NUMBA
+
+    def test_clasificar_dias(self):
+        dias = np.arange(-40, 120, dtype=np.int64)
+        for promedio in (21, 26, 28, 35):
+            for duracion in (1, 3, 5, 8):
+                np.testing.assert_array_equal(
+                    main._clasificar_dias(dias, promedio, duracion),
+                    self.numpy._clasificar_dias(dias, promedio, duracion),
+                )
+
+    def test_momentos_ciclo(self):
+        rng = np.random.default_rng(0)
+        for n in range(1, 12):
+            difs = rng.integers(20, 36, n).astype(np.int32)
+            np.testing.assert_allclose(main._momentos_ciclo(difs), self.numpy._momentos_ciclo(difs))
+
+
+if __name__ == "__main__":
+    unittest.main()